@@ -0,0 +1 @@
+"""Core playback and session storage helpers for mpvRecall."""
@@ -0,0 +1,460 @@
+import io
+import os
+import json
+import sqlite3
+import subprocess
+import streamlit as st
+import re
+import shutil
+import struct
+import datetime
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson # Optional C-accelerated JSON decoder
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Path to store last-played information
+CACHE_PATH = os.path.expanduser("~/.cache/mpv_recall_sessions.json") # Changed cache file name
+# Sessions now live in SQLite; the JSON file above is only read once to import old sessions
+DB_PATH = CACHE_PATH.replace('.json', '.db')
+# Lua script loaded into mpv; kept in the user's own cache dir rather than the shared /tmp
+RECALL_SCRIPT_PATH = os.path.join(os.path.dirname(DB_PATH), "mpv_recall.lua")
+
+# Status line printed by the Lua script (see _RECALL_SCRIPT), matched against raw stdout bytes
+_STATUS_RE = re.compile(rb"\[mpvRecall\]PATH:(.*?)#POS:(\d{1,2}):(\d{2}):(\d{2})")
+
+# Lets CPython start helper processes with os.posix_spawn instead of fork+exec, so the
+# (large) Streamlit process isn't duplicated. This needs close_fds=False (our own fds are
+# non-inheritable anyway) and an absolute executable path, see _resolve_program.
+_SPAWN_KWARGS = {"close_fds": False}
+
+# --- Core Functions ---
+
+def _resolve_program(name):
+    """Returns the absolute path of an executable on PATH, or the bare name if it isn't found."""
+    return shutil.which(name) or name
+
+# Containers whose duration can be read straight from the file header without ffprobe
+_MP4_EXTENSIONS = ('.mp4', '.m4v', '.m4a', '.mov')
+_MKV_EXTENSIONS = ('.mkv', '.webm')
+
+def _mp4_boxes(f, start, end):
+    """Yields (type, body_start, box_end) for each MP4 box between start and end."""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, kind = struct.unpack('>I4s', f.read(8))
+        header_len = 8
+        if size == 1: # 64-bit size follows the type
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_len = 16
+        elif size == 0: # Box runs to the end of its parent
+            size = end - pos
+        if size < header_len:
+            return
+        yield kind, pos + header_len, pos + size
+        pos += size
+
+def _mp4_duration(f):
+    """Reads the duration from moov/mvhd. moov may sit at the end of the file, so top-level boxes are skipped by seeking."""
+    file_end = os.fstat(f.fileno()).st_size
+    for kind, body, end in _mp4_boxes(f, 0, file_end):
+        if kind != b'moov':
+            continue
+        for child, child_body, _ in _mp4_boxes(f, body, end):
+            if child != b'mvhd':
+                continue
+            f.seek(child_body)
+            version = f.read(4)[0]
+            if version == 1:
+                timescale, duration = struct.unpack('>16xIQ', f.read(28))
+                unknown = 0xFFFFFFFFFFFFFFFF
+            else:
+                timescale, duration = struct.unpack('>8xII', f.read(16))
+                unknown = 0xFFFFFFFF
+            # Fragmented MP4s leave duration at 0; ffprobe finds the real one from the fragments
+            if timescale and duration and duration != unknown:
+                return duration / timescale
+            return None
+    return None
+
+def _ebml_vint(f, keep_marker):
+    """Reads an EBML variable-length integer. IDs keep their length marker bit, sizes drop it.
+    Returns None for a size with all value bits set, which means "unknown"."""
+    first = f.read(1)
+    if not first:
+        raise ValueError("unexpected end of file")
+    length = 9 - first[0].bit_length()
+    if length > 8:
+        raise ValueError("invalid EBML varint")
+    raw = first + f.read(length - 1)
+    value = int.from_bytes(raw, 'big')
+    if keep_marker:
+        return value
+    value &= (1 << (7 * length)) - 1
+    return None if value == (1 << (7 * length)) - 1 else value
+
+_EBML_SEGMENT, _EBML_INFO, _EBML_CLUSTER = 0x18538067, 0x1549A966, 0x1F43B675
+_EBML_TIMECODE_SCALE, _EBML_DURATION = 0x2AD7B1, 0x4489
+
+def _mkv_duration(f):
+    """Reads Segment/Info/Duration (scaled by TimecodeScale) from a Matroska or WebM file."""
+    f.seek(0)
+    if _ebml_vint(f, True) != 0x1A45DFA3: # EBML header
+        return None
+    header_size = _ebml_vint(f, False)
+    if header_size is None:
+        return None
+    f.seek(header_size, os.SEEK_CUR)
+    if _ebml_vint(f, True) != _EBML_SEGMENT:
+        return None
+    _ebml_vint(f, False) # Segment size, possibly unknown; we stop at Info anyway
+    while True:
+        element_id, size = _ebml_vint(f, True), _ebml_vint(f, False)
+        if element_id == _EBML_CLUSTER or size is None:
+            return None # Media data started before any Info element
+        if element_id != _EBML_INFO:
+            f.seek(size, os.SEEK_CUR)
+            continue
+        info_end = f.tell() + size
+        timecode_scale, duration = 1_000_000, None
+        while f.tell() < info_end:
+            child_id, child_size = _ebml_vint(f, True), _ebml_vint(f, False)
+            if child_size is None:
+                return None
+            data = f.read(child_size)
+            if child_id == _EBML_TIMECODE_SCALE:
+                timecode_scale = int.from_bytes(data, 'big')
+            elif child_id == _EBML_DURATION:
+                duration = struct.unpack('>f' if child_size == 4 else '>d', data)[0]
+        return duration * timecode_scale / 1e9 if duration else None
+
+def _fast_duration(path):
+    """Returns the duration in seconds by parsing the container directly, or None if unsupported."""
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        with open(path, 'rb') as f:
+            if ext in _MP4_EXTENSIONS:
+                return _mp4_duration(f)
+            if ext in _MKV_EXTENSIONS:
+                return _mkv_duration(f)
+    except (OSError, ValueError, struct.error, IndexError):
+        pass
+    return None
+
+@st.cache_data(show_spinner=False, ttl=24*60*60, max_entries=512)
+def _probe_duration(path, mtime, size):
+    """Returns the duration of a media file in seconds, parsing MP4/MKV headers directly
+    and falling back to ffprobe for everything else.
+    mtime and size are only part of the cache key, so a changed file is probed again."""
+    duration = _fast_duration(path)
+    if duration is not None:
+        return duration
+    cmd = [
+        _resolve_program("ffprobe"),"-v","error",
+        "-show_entries","format=duration",
+        "-of","default=noprint_wrappers=1:nokey=1",
+        path
+    ]
+    try:
+        out = subprocess.check_output(cmd, stderr=subprocess.DEVNULL, **_SPAWN_KWARGS)
+        return float(out.strip())
+    except Exception:
+        return 0
+
+def format_hms(seconds):
+    """Formats seconds as H:MM:SS, like str(timedelta) without building a timedelta."""
+    h, rem = divmod(int(seconds), 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}:{m:02d}:{s:02d}"
+
+def _format_size(size):
+    """Formats a byte count as KB below 1 MiB, MB below 1 GiB and GB above."""
+    if size < 1024**2:
+        return f"{size/1024:.2f} KB"
+    if size < 1024**3:
+        return f"{size/1024**2:.2f} MB"
+    return f"{size/1024**3:.2f} GB"
+
+def get_file_metadata(path):
+    try:
+        st_info = os.stat(path) # One stat call instead of separate getsize/getmtime
+    except OSError:
+        return None
+    size = st_info.st_size
+    mtime = datetime.datetime.fromtimestamp(st_info.st_mtime)
+    duration = _probe_duration(path, st_info.st_mtime, size)
+    return {
+        "size_str": _format_size(size),
+        "duration_str": format_hms(duration),
+        "modified_str": mtime.strftime("%Y‑%m‑%d %H:%M")
+    }
+
+@st.cache_data(ttl=30, show_spinner=False)
+def path_exists(path):
+    """Cached os.path.exists for list rendering; a stat on a slow network mount can take seconds.
+    Call path_exists.clear() to force a fresh check."""
+    return os.path.exists(path)
+
+def get_many_file_metadata(paths):
+    """Fetches metadata for several files at once, running the ffprobe calls in parallel.
+    Returns a dict mapping each path to its metadata (None if the file is missing)."""
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as pool:
+        return dict(zip(paths, pool.map(get_file_metadata, paths)))
+
+_UPSERT_SESSION = "INSERT OR REPLACE INTO sessions (path, is_folder, last_file, position, ts) VALUES (?, ?, ?, ?, ?)"
+_INSERT_NEW_SESSION = "INSERT OR IGNORE INTO sessions (path, is_folder, last_file, position, ts) VALUES (?, ?, ?, ?, ?)"
+
+def _session_row(info):
+    return (
+        info['path'],
+        int(info.get('is_folder', False)),
+        info['last_played_file'],
+        info.get('last_played_position', 0),
+        info.get('last_played_timestamp', ''),
+    )
+
+def _import_json_sessions(conn):
+    """Copies sessions from the old JSON cache file into the database, once.
+    PRAGMA user_version records that the import happened, so deleting every session
+    doesn't bring the old JSON entries back on the next start."""
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+        return
+    sessions = {}
+    if os.path.exists(CACHE_PATH):
+        try:
+            with open(CACHE_PATH, 'rb') as f:
+                sessions = _json_loads(f.read())
+        except (OSError, json.JSONDecodeError):
+            pass
+    if not isinstance(sessions, dict):
+        sessions = {} # Anything but a path -> session mapping counts as "no sessions"
+    # Rows are built up front, skipping malformed entries, so nothing can fail between BEGIN and COMMIT
+    rows = [
+        _session_row({"path": path, **info})
+        for path, info in sessions.items()
+        if isinstance(info, dict) and isinstance(info.get('last_played_file'), str)
+    ]
+    # A single transaction: a crash mid-import leaves neither partial rows nor the import mark,
+    # and existing rows (newer than the JSON file) are kept as they are
+    conn.execute("BEGIN")
+    try:
+        conn.executemany(_INSERT_NEW_SESSION, rows)
+        conn.execute("PRAGMA user_version = 1")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+@st.cache_resource
+def _db():
+    """Opens the sessions database once and shares the connection across reruns."""
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS sessions ("
+        "path TEXT PRIMARY KEY, is_folder INTEGER, last_file TEXT, position REAL, ts TEXT)"
+    )
+    _import_json_sessions(conn)
+    return conn
+
+def load_all_sessions():
+    """Loads all saved media sessions, most recently played first."""
+    rows = _db().execute(
+        "SELECT path, is_folder, last_file, position, ts FROM sessions ORDER BY ts DESC"
+    ).fetchall()
+    return {
+        path: {
+            "path": path,
+            "is_folder": bool(is_folder),
+            "last_played_file": last_file,
+            "last_played_position": position,
+            "last_played_timestamp": ts
+        }
+        for path, is_folder, last_file, position, ts in rows
+    }
+
+def save_session(info):
+    """Inserts or updates a single session, keyed by its original path."""
+    _db().execute(_UPSERT_SESSION, _session_row(info))
+
+def delete_session(path):
+    """Removes the session stored for the given original path."""
+    _db().execute("DELETE FROM sessions WHERE path = ?", (path,))
+
+# Loaded into every mpv run. Prints the current file and position once per second (and when a
+# file is unloaded) and, when MPV_RECALL_SEEK is set, seeks there on the first file load.
+_RECALL_SCRIPT = '''
+local sought = false
+
+function on_file_loaded()
+    if not sought then
+        sought = true
+        local target = tonumber(os.getenv("MPV_RECALL_SEEK"))
+        if target then
+            mp.commandv("seek", target, "absolute")
+        end
+    end
+end
+
+function print_status()
+    local path = mp.get_property("path")
+    local pos = mp.get_property_osd("playback-time")
+    -- get_property_osd returns "" (not nil) while the position is unavailable
+    if path and pos ~= "" then
+        io.stdout:write(string.format("[mpvRecall]PATH:%s#POS:%s\\n", path, pos))
+        io.stdout:flush()
+    end
+end
+
+mp.register_event("file-loaded", on_file_loaded)
+mp.add_periodic_timer(1, print_status)
+mp.add_hook("on_unload", 50, print_status)
+'''
+
+@st.cache_resource
+def _write_recall_script():
+    """Writes the Lua status/resume script once per app run and returns its path."""
+    os.makedirs(os.path.dirname(RECALL_SCRIPT_PATH), exist_ok=True)
+    with open(RECALL_SCRIPT_PATH, 'w') as f:
+        f.write(_RECALL_SCRIPT)
+    return RECALL_SCRIPT_PATH
+
+def _recall_script_path():
+    """Returns the Lua script path, writing it again if it was removed since it was cached."""
+    if not os.path.exists(RECALL_SCRIPT_PATH):
+        _write_recall_script.clear()
+    return _write_recall_script()
+
+def _read_last_status_line(stream):
+    """Reads mpv's stdout until it closes and returns the last complete [mpvRecall] status line (as bytes).
+    Lines with the prefix that don't match _STATUS_RE are skipped, so they can't hide an earlier valid one."""
+    last_status_line = b""
+    pending = b""
+    for chunk in iter(lambda: stream.read(64 * 1024), b""):
+        # Terminal status redraws use '\r', so treat it as a line break too
+        lines = (pending + chunk).replace(b'\r', b'\n').split(b'\n')
+        pending = lines.pop()
+        for line in reversed(lines):
+            if line.startswith(b"[mpvRecall]") and _STATUS_RE.match(line):
+                last_status_line = line
+                break
+    if pending.startswith(b"[mpvRecall]") and _STATUS_RE.match(pending):
+        last_status_line = pending
+    return last_status_line
+
+def play(path_to_play, start_pos=None, playlist_start_index=None, resume_specific_file=None, debug=False):
+    """
+    Plays media with mpv, blocking until it exits.
+    Can specify a start time and a playlist start index.
+    If resume_specific_file is provided, only applies start position to that specific file.
+    If debug is set, mpv's full output is captured and shown in an expander.
+    Returns the last played file path and its position.
+    """
+    cmd = [
+        _resolve_program("mpv"),
+        "--force-window",
+        f"--script={_recall_script_path()}"
+    ]
+    if not debug:
+        # The script writes status lines itself, so mpv's own terminal output is noise
+        cmd.append("--msg-level=all=no")
+
+    env = dict(os.environ)
+
+    # If we're resuming a specific file in a folder playlist
+    if resume_specific_file and playlist_start_index is not None and os.path.isdir(path_to_play):
+        # Start at the specific file in the playlist
+        cmd.append(f"--playlist-start={playlist_start_index}")
+        
+        # Seek only on the first file load; the Lua script reads the target from the environment
+        env["MPV_RECALL_SEEK"] = str(max(start_pos-5,0))
+    else:
+        # Standard behavior for single files or new playback
+        if start_pos:
+            cmd.append(f"--start={start_pos}")
+        if playlist_start_index is not None:
+            cmd.append(f"--playlist-start={playlist_start_index}")
+
+    cmd.append(path_to_play)
+
+    try:
+        if debug:
+            proc = subprocess.run(cmd, capture_output=True, check=False, env=env, **_SPAWN_KWARGS)
+        else:
+            # Stream stdout instead of buffering it: only the latest status line is kept
+            with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0, env=env, **_SPAWN_KWARGS) as proc:
+                last_status_line = _read_last_status_line(proc.stdout)
+    except FileNotFoundError:
+        st.error("Error: `mpv` command not found. Please ensure mpv is installed and in your PATH.")
+        return None
+
+    if debug:
+        if proc.stdout or proc.stderr:
+            with st.expander("Show raw mpv output (for debugging)"):
+                st.code(
+                    f"--- STDOUT ---\n{proc.stdout.decode(errors='replace')}\n\n"
+                    f"--- STDERR ---\n{proc.stderr.decode(errors='replace')}"
+                )
+        last_status_line = _read_last_status_line(io.BytesIO(proc.stdout))
+
+    if not last_status_line:
+        return None
+
+    match = _STATUS_RE.search(last_status_line)
+    if match:
+        file_path = os.fsdecode(match[1])
+        # The regex only matches digits, so int() on the groups cannot fail
+        position = float(int(match[2]) * 3600 + int(match[3]) * 60 + int(match[4]))
+        if position > 2: # Save only if position is significant (more than 2 seconds)
+            return {"path": file_path, "position": position}
+
+    return None
+
+def pick_file_or_folder(mode="file"):
+    """Opens a native file dialog using Zenity."""
+    cmd = [_resolve_program("zenity"), "--file-selection"]
+    if mode == "folder":
+        cmd.append("--directory")
+    
+    try:
+        out = subprocess.check_output(cmd, **_SPAWN_KWARGS)
+        return out.decode().strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        if "FileNotFoundError":
+            st.error("`zenity` is not installed. Please run `sudo apt install zenity` (or equivalent).")
+        return None
+
+MEDIA_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.flv', '.webm', '.mp3', '.wav', '.ogg') # Add more as needed
+
+# Sorted media paths in a folder plus a path -> playlist index lookup
+MediaListing = namedtuple("MediaListing", ["files", "index"])
+
+@st.cache_data(show_spinner=False)
+def _list_media(folder, mtime_ns):
+    """Lists media files in a folder. mtime_ns is only part of the cache key,
+    so the listing is rebuilt whenever the folder's contents change."""
+    with os.scandir(folder) as it:
+        files = tuple(sorted(
+            os.path.join(folder, entry.name)
+            for entry in it
+            if entry.is_file() and entry.name.lower().endswith(MEDIA_EXTENSIONS)
+        ))
+    return files, {path: i for i, path in enumerate(files)}
+
+def get_media_files(folder):
+    """Gets the sorted media files in a given folder (non-recursive) with their playlist indices."""
+    try:
+        # Wrapped here rather than in _list_media so the cached value stays a plain tuple
+        return MediaListing(*_list_media(folder, os.stat(folder).st_mtime_ns))
+    except OSError:
+        return MediaListing((), {})